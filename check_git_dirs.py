@@ -4,115 +4,727 @@ Checks the status of all git directories in the current directory.
 Prints the output of git rev-parse
 """
 
+import os
+import re
+import json
+import asyncio
 import pathlib
 import argparse
-from subprocess import check_output
+import tempfile
+from typing import Optional
+from subprocess import PIPE, CalledProcessError, check_output, run
 import logging
 
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+GIT_STATUS_COMMAND = ("git", "--no-optional-locks", "status", "--porcelain=v2")
+
+BRANCH_HEAD_RE = re.compile(rb"^# branch\.head (.*)$", re.MULTILINE)
+BRANCH_AHEAD_RE = re.compile(rb"^# branch\.ab \+[1-9]", re.MULTILINE)
+CHANGED_ENTRY_RE = re.compile(rb"^[^#\n]", re.MULTILINE)
+CONFIG_SECTION_RE = re.compile(r'\s*\[\s*([^\s"\]]+)\s*(?:"((?:[^"\\\n]|\\.)*)")?\s*\]')
+
+DEFAULT_MAX_CONCURRENT = min(16, (os.cpu_count() or 1) * 2)
+
+BLUE = "\033[1;34m"
+GREEN = "\033[1;32m"
+YELLOW = "\033[1;33m"
+RED = "\033[1;31m"
+
+OKAY_LABEL = f"{GREEN} \u2713"
+REQUIRES_PUSH_LABEL = f"{YELLOW} - Requires push"
+UNSTAGED_LABEL = f"{RED} \u2717 Unstaged changes"
+
+DEFAULT_CACHE_PATH = pathlib.Path.home() / ".cache" / "check_git_dirs.json"
+
+DEFAULT_IGNORE_NAMES = frozenset({".venv", "node_modules", "__pycache__", ".tox"})
+
+# Pipes find into xargs, which runs git status in up to $2 parallel shells, with $3 passed to --untracked-files. Each
+# shell prints the repository path and the start of its status (the branch headers, at most the first changed entry and
+# git's exit status) in a single printf, so that output from different repositories is not interleaved.
+SHELL_FAST_SCRIPT = r"""
+directory="$1"
+jobs="$2"
+untracked="$3"
+shift 3
+find "$directory" -mindepth 1 \( "$@" \) -prune -o -name .git -type d -prune -print0 |
+    xargs -0 -n 1 -P "$jobs" sh -c '
+        [ -n "$2" ] || exit 0
+        repo=$(dirname "$2")
+        status=$(
+            {
+                git -C "$repo" --no-optional-locks status --porcelain=v2 --branch --untracked-files="$1"
+                echo "EXIT:$?"
+            } |
+                awk "/^EXIT:/ || !entry { print } !/^#/ { entry = 1 }"
+        )
+        printf "REPO:%s\n%s\n" "$repo" "$status"
+    ' sh "$untracked"
+"""
+
+_upstream_branches_cache = {}
+
 
-def add_branch_label(record_branches: bool, git_status: str, output_message: str) -> str:
+def add_branch_label(record_branches: bool, branch_name: str, output_message: str) -> str:
     """
     Adds the branch label to the output message if record_branches is True.
 
     :param record_branches: Whether to record branch names.
-    :param git_status: The status of the git repository.
+    :param branch_name: The name of the current branch of the git repository.
     :param output_message: The current output message.
     :return: The updated output message with the branch label if applicable.
     """
     if record_branches:
-        branch_name = git_status.splitlines()[0].replace("On branch ", "")
         return f"{output_message} - {branch_name}"
     return output_message
 
 
-def read_check_ignore(cur_dir: pathlib.Path) -> list[str]:
+def parse_git_status(git_status: bytes) -> tuple[str, bool, bool]:
+    """
+    Parses the raw output of git status --porcelain=v2 --branch.
+
+    Only the branch name is decoded, and since the headers come first only the output before the first changed entry is
+    searched for them.
+
+    :param git_status: The porcelain status output of the git repository.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    """
+    changed_entry = CHANGED_ENTRY_RE.search(git_status)
+    end = changed_entry.start() if changed_entry is not None else len(git_status)
+    branch_head = BRANCH_HEAD_RE.search(git_status, 0, end)
+    branch_name = branch_head.group(1).decode("utf-8", "replace") if branch_head is not None else ""
+    return branch_name, changed_entry is not None, BRANCH_AHEAD_RE.search(git_status, 0, end) is not None
+
+
+def read_check_ignore(cur_dir: pathlib.Path) -> frozenset[str]:
     """
     Reads the .check_ignore file in the current directory if it exists.
 
     :param cur_dir: The current directory path.
-    :return: A list of ignored directory names.
+    :return: A set of ignored directory names.
     """
     check_ignore_file = cur_dir / ".check_ignore"
     if check_ignore_file.exists() and check_ignore_file.is_file():
         with check_ignore_file.open("rt") as f:
-            return [x.strip() for x in f.readlines()]
-    return []
+            return frozenset(x.strip() for x in f.readlines() if x.strip())
+    return frozenset()
 
 
-def find_git_dirs(directory: pathlib.Path) -> list[pathlib.Path]:
+def find_git_dirs(
+    directory: pathlib.Path, ignore_names: frozenset[str] = frozenset()
+) -> tuple[list[str], list[str]]:
     """
     Finds all git directories in the given directory recursively.
 
+    Does not descend into git repositories once found, nor into directories named in ignore_names or
+    DEFAULT_IGNORE_NAMES.
+
     :param directory: The directory to search in.
-    :return: A list of paths to git directories.
+    :param ignore_names: The set of directory names to ignore.
+    :return: A tuple containing a list of paths to git directories and a list of the ignored directories that were skipped.
+    """
+    git_dirs, ignore_dirs = [], []
+    stack = [str(directory)]
+    while stack:
+        cur_dir = stack.pop()
+        try:
+            with os.scandir(cur_dir) as it:
+                entries = [x for x in it if x.is_dir(follow_symlinks=False)]
+        except OSError:
+            continue
+        if any(x.name == ".git" for x in entries):
+            git_dirs.append(cur_dir)
+            continue
+        for entry in reversed(entries):
+            # Paths under the current directory are kept relative, without a leading "./"
+            path = entry.name if cur_dir == os.curdir else entry.path
+            if entry.name in ignore_names:
+                ignore_dirs.append(path)
+            elif entry.name not in DEFAULT_IGNORE_NAMES:
+                stack.append(path)
+    return git_dirs, ignore_dirs
+
+
+def stat_git_dirs(git_dirs: list[str]) -> dict[str, Optional[os.stat_result]]:
     """
-    return [x.parent for x in directory.rglob(".git") if x.is_dir()]
+    Stats each git directory once, for use by both remove_duplicate_dirs and sort_by_locality.
+
+    :param git_dirs: The git directories to stat.
+    :return: A dictionary mapping each git directory to its stat result, or None if it could not be stat'ed.
+    """
+    dir_stats = {}
+    for git_dir in git_dirs:
+        try:
+            dir_stats[git_dir] = os.stat(git_dir)
+        except OSError:
+            dir_stats[git_dir] = None
+    return dir_stats
 
 
-def filter_ignored_dirs(
-    git_dirs: list[pathlib.Path], ignore_names: list[str]
-) -> tuple[list[pathlib.Path], list[pathlib.Path]]:
+def sort_by_locality(git_dirs: list[str], dir_stats: dict[str, Optional[os.stat_result]]) -> list[str]:
     """
-    Filters out ignored directories from the list of git directories.
+    Sorts git directories by device and then by path, so that repositories in the same subtree are read together.
 
-    :param git_dirs: The list of git directories.
-    :param ignore_names: The list of directory names to ignore.
-    :return: A tuple containing the filtered git directories and the ignored directories.
+    :param git_dirs: The git directories to sort.
+    :param dir_stats: The stat results for the git directories, from stat_git_dirs.
+    :return: A new sorted list of the git directories.
     """
-    ignore_dirs = [x for x in git_dirs if x.name in ignore_names]
-    git_dirs = [x for x in git_dirs if x.name not in ignore_names]
-    return git_dirs, ignore_dirs
+
+    def locality_key(git_dir: str) -> tuple[int, str]:
+        st = dir_stats.get(git_dir)
+        return (st.st_dev if st is not None else 0), git_dir
+
+    return sorted(git_dirs, key=locality_key)
+
+
+def remove_duplicate_dirs(git_dirs: list[str], dir_stats: dict[str, Optional[os.stat_result]]) -> list[str]:
+    """
+    Removes git directories which are the same directory as an earlier one, such as through a bind mount.
+
+    Directories are compared by device and inode rather than by path, so that each repository is only read and counted
+    once per scan.
+
+    :param git_dirs: The git directories to check.
+    :param dir_stats: The stat results for the git directories, from stat_git_dirs.
+    :return: A new list containing the first occurrence of each directory, in the original order.
+    """
+    seen, unique_dirs = set(), []
+    for git_dir in git_dirs:
+        st = dir_stats.get(git_dir)
+        key = (st.st_dev, st.st_ino) if st is not None else os.path.realpath(git_dir)
+        if key not in seen:
+            seen.add(key)
+            unique_dirs.append(git_dir)
+    return unique_dirs
+
+
+def read_upstream_branches(git_dir: str) -> Optional[frozenset[str]]:
+    """
+    Reads the names of the branches with a [branch "name"] section in the repository's .git/config.
+
+    Section headers are matched line by line, as git reads them, with the section name compared case-insensitively.
+    Results are cached by the path and modification time of the config file.
+
+    :param git_dir: The git directory to read.
+    :return: A set of branch names, or None if they cannot be determined from the config file alone.
+    """
+    config_path = os.path.join(git_dir, ".git", "config")
+    try:
+        key = (git_dir, os.stat(config_path).st_mtime_ns)
+    except OSError:
+        return None
+    if key not in _upstream_branches_cache:
+        _upstream_branches_cache[key] = None
+        try:
+            with open(config_path, "rt", encoding="utf-8") as f:
+                lines = f.readlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+        branch_names = set()
+        for line in lines:
+            if not line.lstrip().startswith("["):
+                continue
+            match = CONFIG_SECTION_RE.match(line)
+            if match is None:
+                return None
+            section, subsection = match.group(1).lower(), match.group(2)
+            if section.startswith(("branch.", "include")) or (subsection is not None and "\\" in subsection):
+                # Included files, the deprecated [branch.name] syntax and escaped names are left to git to resolve
+                return None
+            if section == "branch" and subsection is not None:
+                branch_names.add(subsection)
+        _upstream_branches_cache[key] = frozenset(branch_names)
+    return _upstream_branches_cache[key]
+
+
+def get_git_status_command(with_branch: bool, include_untracked: bool) -> tuple[str, ...]:
+    """
+    Gets the git status command to run.
+
+    :param with_branch: Whether to include the branch headers, which compare the branch against its upstream.
+    :param include_untracked: Whether to look for untracked files, which can be slow in large repositories.
+    :return: The command as a tuple of arguments.
+    """
+    return (
+        *GIT_STATUS_COMMAND,
+        *(("--branch",) if with_branch else ()),
+        "--untracked-files=normal" if include_untracked else "--untracked-files=no",
+    )
+
+
+def get_branch_without_upstream(git_dir: str) -> Optional[str]:
+    """
+    Gets the current branch from .git/HEAD if it is known to have no upstream, in which case it cannot be ahead.
+
+    :param git_dir: The git directory to read.
+    :return: The branch name ("(detached)" for a detached HEAD), or None if the branch may have an upstream.
+    """
+    try:
+        with open(os.path.join(git_dir, ".git", "HEAD"), "rt", encoding="utf-8") as f:
+            head = f.read().strip()
+    except (OSError, UnicodeDecodeError):
+        return None
+    if not head.startswith("ref: refs/heads/"):
+        return "(detached)" if not head.startswith("ref: ") else None
+    branch_name = head[len("ref: refs/heads/") :]
+    upstream_branches = read_upstream_branches(git_dir)
+    if upstream_branches is None or branch_name in upstream_branches:
+        return None
+    return branch_name
+
+
+def read_git_status_subprocess(git_dir: str, include_untracked: bool = False) -> tuple[str, bool, bool]:
+    """
+    Reads the status of a git repository by running git status.
+
+    The branch header, and with it the upstream comparison, is only requested if the branch may have an upstream.
+
+    :param git_dir: The git directory to read.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    """
+    branch_name = get_branch_without_upstream(git_dir)
+    command = get_git_status_command(branch_name is None, include_untracked)
+    if branch_name is None:
+        return parse_git_status(check_output(command, cwd=git_dir))
+    _, has_changes, _ = parse_git_status(check_output(command, cwd=git_dir))
+    return branch_name, has_changes, False
+
+
+async def run_git_status_async(command: tuple[str, ...], git_dir: str) -> bytes:
+    """
+    Runs a git status command without blocking the event loop.
+
+    :param command: The git status command to run.
+    :param git_dir: The git directory to run it in.
+    :return: The raw output of the command.
+    :raises CalledProcessError: If git status fails.
+    """
+    proc = await asyncio.create_subprocess_exec(*command, cwd=git_dir, stdout=PIPE)
+    git_status, _ = await proc.communicate()
+    if proc.returncode != 0:
+        raise CalledProcessError(proc.returncode, command, git_status)
+    return git_status
+
+
+async def read_git_status_subprocess_async(git_dir: str, include_untracked: bool = False) -> tuple[str, bool, bool]:
+    """
+    Reads the status of a git repository by running git status without blocking the event loop.
+
+    :param git_dir: The git directory to read.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    :raises CalledProcessError: If git status fails.
+    """
+    branch_name = get_branch_without_upstream(git_dir)
+    command = get_git_status_command(branch_name is None, include_untracked)
+    if branch_name is None:
+        return parse_git_status(await run_git_status_async(command, git_dir))
+    _, has_changes, _ = parse_git_status(await run_git_status_async(command, git_dir))
+    return branch_name, has_changes, False
+
+
+def read_git_status_pygit2(git_dir: str, include_untracked: bool = False) -> tuple[str, bool, bool]:
+    """
+    Reads the status of a git repository in-process using pygit2.
+
+    The repository is opened for this read only, so that its pack files are closed again afterwards. The upstream is
+    only compared when there are no changes, as a repository with changes is reported as such whether or not it is
+    ahead. Repositories libgit2 fails to read are read by running git status instead.
+
+    :param git_dir: The git directory to read.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    """
+    try:
+        repo = pygit2.Repository(git_dir)
+        has_changes = len(repo.status(untracked_files="normal" if include_untracked else "no")) > 0
+        if repo.head_is_detached:
+            return "(detached)", has_changes, False
+        if repo.head_is_unborn:
+            return repo.references["HEAD"].target.replace("refs/heads/", "", 1), has_changes, False
+        branch_name = repo.head.shorthand
+        branch = repo.branches.local.get(branch_name)
+        upstream = branch.upstream if branch is not None and not has_changes else None
+        if upstream is None:
+            return branch_name, has_changes, False
+        ahead, _ = repo.ahead_behind(branch.target, upstream.target)
+        return branch_name, has_changes, ahead > 0
+    except pygit2.GitError:
+        # libgit2 cannot read some repositories that git can, such as those with a split or sparse index
+        return read_git_status_subprocess(git_dir, include_untracked)
+
+
+def read_git_status(git_dir: str, include_untracked: bool = False) -> tuple[str, bool, bool]:
+    """
+    Reads the status of a git repository, using pygit2 if it is installed and falling back to the git executable.
+
+    :param git_dir: The git directory to read.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    """
+    if pygit2 is not None:
+        return read_git_status_pygit2(git_dir, include_untracked)
+    return read_git_status_subprocess(git_dir, include_untracked)
+
+
+def get_git_dir_mtimes(git_dir: str) -> list[Optional[int]]:
+    """
+    Gets the modification times of the files git updates when the index, HEAD or packed refs change.
+
+    :param git_dir: The git directory to check.
+    :return: A list of modification times in nanoseconds, with None for any file that does not exist.
+    """
+    mtimes = []
+    for name in ("index", "HEAD", "packed-refs"):
+        try:
+            mtimes.append(os.stat(os.path.join(git_dir, ".git", name)).st_mtime_ns)
+        except FileNotFoundError:
+            mtimes.append(None)
+    return mtimes
+
+
+def read_status_cache(cache_path: pathlib.Path) -> dict:
+    """
+    Reads the status cache file if it exists.
+
+    :param cache_path: The path to the cache file.
+    :return: A dictionary mapping absolute git directory paths to their cached modification times and status.
+    """
+    try:
+        with cache_path.open("rt") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def write_status_cache(cache_path: pathlib.Path, cache: dict) -> None:
+    """
+    Atomically writes the status cache file, replacing any existing cache.
+
+    :param cache_path: The path to the cache file.
+    :param cache: The cache to write.
+    """
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent, prefix=f".{cache_path.name}.")
+    try:
+        with os.fdopen(fd, "wt") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def get_cached_git_status(
+    cache: dict, git_dir: str, mtimes: list[Optional[int]], include_untracked: bool = False
+) -> Optional[tuple[str, bool, bool]]:
+    """
+    Gets the cached status of a git repository if git's index, HEAD and packed refs are unchanged.
+
+    :param cache: The status cache, as returned by read_status_cache.
+    :param git_dir: The git directory to look up.
+    :param mtimes: The current modification times, as returned by get_git_dir_mtimes.
+    :param include_untracked: Whether the status must have been read with untracked files counted as changes.
+    :return: The cached tuple of branch name, changes and ahead flags, or None if there is no valid entry.
+    """
+    entry = cache.get(os.path.abspath(git_dir))
+    if (
+        not isinstance(entry, dict)
+        or entry.get("mtimes") != mtimes
+        or entry.get("include_untracked", False) != include_untracked
+    ):
+        return None
+    status = entry.get("status")
+    if not isinstance(status, list) or len(status) != 3:
+        return None
+    branch_name, has_changes, is_ahead = status
+    if not isinstance(branch_name, str) or not isinstance(has_changes, bool) or not isinstance(is_ahead, bool):
+        return None
+    return branch_name, has_changes, is_ahead
+
+
+def set_cached_git_status(
+    cache: dict,
+    git_dir: str,
+    mtimes: list[Optional[int]],
+    status: tuple[str, bool, bool],
+    include_untracked: bool = False,
+) -> None:
+    """
+    Stores the status of a git repository in the cache.
+
+    :param cache: The status cache, as returned by read_status_cache.
+    :param git_dir: The git directory to store.
+    :param mtimes: The modification times the status was read at, as returned by get_git_dir_mtimes.
+    :param status: The tuple of branch name, changes and ahead flags to store.
+    :param include_untracked: Whether the status was read with untracked files counted as changes.
+    """
+    cache[os.path.abspath(git_dir)] = {"mtimes": mtimes, "include_untracked": include_untracked, "status": list(status)}
+
+
+def read_git_status_cached(git_dir: str, cache: dict, include_untracked: bool = False) -> tuple[str, bool, bool]:
+    """
+    Reads the status of a git repository, reusing the cached status if git's index, HEAD and packed refs are unchanged.
+
+    The cache is updated in place on a miss.
+
+    :param git_dir: The git directory to read.
+    :param cache: The status cache, as returned by read_status_cache.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the branch name, a boolean indicating if there are changes, and a boolean indicating if the branch is ahead of its upstream.
+    """
+    mtimes = get_git_dir_mtimes(git_dir)
+    status = get_cached_git_status(cache, git_dir, mtimes, include_untracked)
+    if status is None:
+        status = read_git_status(git_dir, include_untracked)
+        set_cached_git_status(cache, git_dir, mtimes, status, include_untracked)
+    return status
+
+
+def format_git_status(
+    git_dir: str, record_branches: bool, branch_name: str, has_changes: bool, is_ahead: bool
+) -> tuple[str, bool, bool]:
+    """
+    Formats the status of a git directory for output.
+
+    :param git_dir: The git directory that was read.
+    :param record_branches: Whether to record branch names.
+    :param branch_name: The name of the current branch.
+    :param has_changes: Whether the repository has changes.
+    :param is_ahead: Whether the branch is ahead of its upstream.
+    :return: A tuple containing the output message, a boolean indicating if the repository is okay, and a boolean indicating if it requires a push.
+    """
+    if not has_changes:
+        if is_ahead:
+            output_message = "".join((BLUE, git_dir, ": ", REQUIRES_PUSH_LABEL))
+            return add_branch_label(record_branches, branch_name, output_message), False, True
+        else:
+            output_message = "".join((BLUE, git_dir, ": ", OKAY_LABEL))
+            return add_branch_label(record_branches, branch_name, output_message), True, False
+    else:
+        output_message = "".join((BLUE, git_dir, ": ", UNSTAGED_LABEL))
+        return add_branch_label(record_branches, branch_name, output_message), False, False
 
 
-def process_git_dir(git_dir: pathlib.Path, record_branches: bool) -> tuple[str, bool, bool]:
+def process_git_dir(
+    git_dir: str, record_branches: bool, cache: Optional[dict] = None, include_untracked: bool = False
+) -> tuple[str, bool, bool]:
     """
     Processes a single git directory to determine its status.
 
     :param git_dir: The git directory to process.
     :param record_branches: Whether to record branch names.
+    :param cache: The status cache to consult and update, or None to always read the repository.
+    :param include_untracked: Whether untracked files count as changes.
     :return: A tuple containing the output message, a boolean indicating if the repository is okay, and a boolean indicating if it requires a push.
     """
-    rev_parse = check_output(["git", "status", "-s"], cwd=git_dir).decode("utf-8").splitlines()
-    git_status = check_output(["git", "status"], cwd=git_dir).decode("utf-8")
-    output_message = f"\033[1;34m{git_dir}: "
-    if len(rev_parse) == 0:
-        if "Your branch is ahead" in git_status:
-            output_message += "\033[1;33m - Requires push"
-            return add_branch_label(record_branches, git_status, output_message), False, True
-        else:
-            output_message += "\033[1;32m \u2713"
-            return add_branch_label(record_branches, git_status, output_message), True, False
+    if cache is None:
+        status = read_git_status(git_dir, include_untracked)
     else:
-        output_message += "\033[1;31m \u2717 Unstaged changes"
-        return add_branch_label(record_branches, git_status, output_message), False, False
+        status = read_git_status_cached(git_dir, cache, include_untracked)
+    return format_git_status(git_dir, record_branches, *status)
+
+
+async def process_git_dir_async(
+    git_dir: str,
+    record_branches: bool,
+    semaphore: asyncio.Semaphore,
+    cache: Optional[dict] = None,
+    include_untracked: bool = False,
+) -> tuple[str, bool, bool]:
+    """
+    Processes a single git directory to determine its status, waiting on the semaphore before reading the repository.
+
+    pygit2 reads are run in a worker thread; otherwise git status is run as an asynchronous subprocess.
+
+    :param git_dir: The git directory to process.
+    :param record_branches: Whether to record branch names.
+    :param semaphore: The semaphore bounding the number of repositories read at once.
+    :param cache: The status cache to consult and update, or None to always read the repository.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the output message, a boolean indicating if the repository is okay, and a boolean indicating if it requires a push.
+    """
+    mtimes = get_git_dir_mtimes(git_dir) if cache is not None else None
+    status = get_cached_git_status(cache, git_dir, mtimes, include_untracked) if cache is not None else None
+    if status is None:
+        async with semaphore:
+            if pygit2 is not None:
+                status = await asyncio.to_thread(read_git_status_pygit2, git_dir, include_untracked)
+            else:
+                status = await read_git_status_subprocess_async(git_dir, include_untracked)
+        if cache is not None:
+            set_cached_git_status(cache, git_dir, mtimes, status, include_untracked)
+    return format_git_status(git_dir, record_branches, *status)
+
+
+async def process_git_dirs_async(
+    git_dirs: list[str],
+    record_branches: bool,
+    max_concurrent: int,
+    cache: Optional[dict] = None,
+    include_untracked: bool = False,
+) -> list[tuple[str, bool, bool]]:
+    """
+    Processes git directories concurrently, reading at most max_concurrent repositories at once.
+
+    :param git_dirs: The git directories to process.
+    :param record_branches: Whether to record branch names.
+    :param max_concurrent: The maximum number of repositories to read at once.
+    :param cache: The status cache to consult and update, or None to always read the repositories.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A list of the results of process_git_dir_async, in the same order as git_dirs.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    return await asyncio.gather(
+        *(process_git_dir_async(x, record_branches, semaphore, cache, include_untracked) for x in git_dirs)
+    )
 
 
 def scan_all_git_repos(
-    directory: pathlib.Path, record_branches: bool = False
+    directory: pathlib.Path,
+    record_branches: bool = False,
+    max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+    cache_path: Optional[pathlib.Path] = None,
+    include_untracked: bool = False,
 ) -> tuple[int, int, int, list[str], list[str]]:
     """
     Scans all git repositories in the given directory and checks their status.
 
+    Repositories are processed concurrently in order of device and path (see sort_by_locality), which is also the order
+    results are reported in.
+
     :param directory: The directory to scan.
     :param record_branches: Whether to record branch names.
+    :param max_concurrent: The maximum number of repositories to process at once (1 processes them sequentially).
+    :param cache_path: The path to a status cache file to use between runs, or None to disable caching.
+    :param include_untracked: Whether untracked files count as changes.
     :return: A tuple containing the total number of unstaged changes, the total number of repositories requiring a push, the total number of okay repositories, a list of directories with unstaged changes, and a list of directories requiring a push.
     """
     if not directory.exists():
         raise IOError(f"Directory does not exist at {directory}")
 
-    git_dirs = find_git_dirs(directory)
     ignore_names = read_check_ignore(directory)
-    git_dirs, ignore_dirs = filter_ignored_dirs(git_dirs, ignore_names)
+    git_dirs, ignore_dirs = find_git_dirs(directory, ignore_names)
+    dir_stats = stat_git_dirs(git_dirs)
+    unique_dirs = sort_by_locality(remove_duplicate_dirs(git_dirs, dir_stats), dir_stats)
 
     logging.info(f"Found {len(git_dirs)} directories containing git repos.")
+    if len(unique_dirs) != len(git_dirs):
+        logging.info(f"Skipping {len(git_dirs) - len(unique_dirs)} directories which duplicate another repo.")
+    git_dirs = unique_dirs
     if ignore_dirs:
-        logging.info(f"Ignoring {len(ignore_dirs)} directories containing git repos.")
+        logging.info(f"Ignoring {len(ignore_dirs)} directories listed in .check_ignore.")
 
+    cache = read_status_cache(cache_path) if cache_path is not None else None
+    if max_concurrent < 2 or len(git_dirs) < 2:
+        results = [process_git_dir(x, record_branches, cache, include_untracked) for x in git_dirs]
+    else:
+        results = asyncio.run(
+            process_git_dirs_async(git_dirs, record_branches, max_concurrent, cache, include_untracked)
+        )
+    if cache is not None:
+        write_status_cache(cache_path, cache)
+
+    return tally_results(git_dirs, results)
+
+
+def scan_all_git_repos_shell(
+    directory: pathlib.Path,
+    record_branches: bool = False,
+    max_concurrent: int = DEFAULT_MAX_CONCURRENT,
+    include_untracked: bool = False,
+) -> tuple[int, int, int, list[str], list[str]]:
+    """
+    Scans all git repositories in the given directory with a find, xargs and git shell pipeline.
+
+    The pipeline does not stop at repositories, so repositories nested inside another repository's worktree are
+    dropped after parsing, to report the same repositories as find_git_dirs. Results are reported sorted by path.
+
+    :raises CalledProcessError: If git status fails in any repository, after logging each repository it failed in.
+
+    :param directory: The directory to scan.
+    :param record_branches: Whether to record branch names.
+    :param max_concurrent: The maximum number of repositories to process at once.
+    :param include_untracked: Whether untracked files count as changes.
+    :return: A tuple containing the total number of unstaged changes, the total number of repositories requiring a push, the total number of okay repositories, a list of directories with unstaged changes, and a list of directories requiring a push.
+    """
+    if not directory.exists():
+        raise IOError(f"Directory does not exist at {directory}")
+
+    prune_args = []
+    for name in sorted(DEFAULT_IGNORE_NAMES | read_check_ignore(directory)):
+        prune_args.extend(("-o", "-name", name) if prune_args else ("-name", name))
+    output = run(
+        [
+            "sh",
+            "-c",
+            SHELL_FAST_SCRIPT,
+            "sh",
+            str(directory),
+            str(max_concurrent),
+            "normal" if include_untracked else "no",
+            *prune_args,
+        ],
+        stdout=PIPE,
+        check=True,
+    ).stdout
+
+    statuses, exit_codes = {}, {}
+    git_dir, lines = None, []
+    for line in output.splitlines() + [b"REPO:"]:
+        if line.startswith(b"REPO:"):
+            if git_dir is not None:
+                statuses[git_dir] = parse_git_status(b"\n".join(lines))
+            git_dir, lines = os.path.normpath(os.fsdecode(line[len(b"REPO:") :])), []
+        elif line.startswith(b"EXIT:"):
+            exit_codes[git_dir] = int(line[len(b"EXIT:") :])
+        else:
+            lines.append(line)
+    root = os.path.normpath(directory)
+
+    def is_nested(git_dir: str) -> bool:
+        parent = git_dir
+        while parent != root:
+            parent, child = os.path.dirname(parent) or os.curdir, parent
+            if parent == child:
+                return False
+            if parent in statuses:
+                return True
+        return False
+
+    git_dirs = sorted(x for x in statuses if not is_nested(x))
+
+    logging.info(f"Found {len(git_dirs)} directories containing git repos.")
+
+    failed_dirs = [x for x in git_dirs if exit_codes.get(x, 1) != 0]
+    for x in failed_dirs:
+        logging.error(f"{RED}git status failed in {x}")
+    if failed_dirs:
+        raise CalledProcessError(exit_codes.get(failed_dirs[0], 1), get_git_status_command(True, include_untracked))
+
+    results = [format_git_status(x, record_branches, *statuses[x]) for x in git_dirs]
+    return tally_results(git_dirs, results)
+
+
+def tally_results(
+    git_dirs: list[str], results: list[tuple[str, bool, bool]]
+) -> tuple[int, int, int, list[str], list[str]]:
+    """
+    Totals the results of processing git directories, logging the output messages for all of them in a single record.
+
+    :param git_dirs: The git directories that were processed.
+    :param results: The results of process_git_dir for each of git_dirs.
+    :return: A tuple containing the total number of unstaged changes, the total number of repositories requiring a push, the total number of okay repositories, a list of directories with unstaged changes, and a list of directories requiring a push.
+    """
     total_push, total_okay, total_unstaged = 0, 0, 0
-    unstaged_list, push_list = [], []
+    unstaged_list, push_list, output_messages = [], [], []
 
-    for git_dir in git_dirs:
-        output_message, is_okay, requires_push = process_git_dir(git_dir, record_branches)
+    for git_dir, (output_message, is_okay, requires_push) in zip(git_dirs, results):
         if requires_push:
             total_push += 1
             push_list.append(git_dir)
@@ -121,7 +733,9 @@ def scan_all_git_repos(
         else:
             total_unstaged += 1
             unstaged_list.append(git_dir)
-        logging.info(output_message)
+        output_messages.append(output_message)
+    if output_messages:
+        logging.info("\n".join(output_messages))
 
     return total_unstaged, total_push, total_okay, unstaged_list, push_list
 
@@ -166,27 +780,84 @@ def main():
     parser.add_argument(
         "-b", "--branch", action="store_true", default=False, help="Output the branch that each folder is currently on"
     )
+    parser.add_argument(
+        "-j",
+        "--max-concurrent",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT,
+        metavar="N",
+        help=f"Maximum number of repositories to check at once (defaults to {DEFAULT_MAX_CONCURRENT})",
+    )
+    parser.add_argument(
+        "--no-concurrent",
+        action="store_true",
+        default=False,
+        help="Check repositories one at a time",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Reuse the status of repositories whose index, HEAD and packed refs are unchanged since the last run. "
+        "Edits to tracked files which have not been staged and pushes are not detected until git next updates one of "
+        "these files",
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=str(DEFAULT_CACHE_PATH),
+        metavar="PATH",
+        help=f"Path to the file used by --cache (defaults to {DEFAULT_CACHE_PATH})",
+    )
+    parser.add_argument(
+        "--include-untracked",
+        action="store_true",
+        default=False,
+        help="Count untracked files as unstaged changes (slower in large repositories)",
+    )
+    parser.add_argument(
+        "--shell-fast",
+        action="store_true",
+        default=False,
+        help="Find and check repositories with a find, xargs and git shell pipeline instead of in Python "
+        "(requires a POSIX shell; --cache is not used)",
+    )
     args = parser.parse_args()
+    if args.max_concurrent < 1:
+        parser.error("--max-concurrent must be at least 1")
     logging.basicConfig(format="%(message)s")
     if args.verbose:
         logging.getLogger().setLevel(20)
     else:
         logging.getLogger().setLevel(30)
-    total_unstaged, total_push, total_okay, unstaged_list, push_list = scan_all_git_repos(
-        pathlib.Path(args.dir), args.branch
-    )
+    max_concurrent = 1 if args.no_concurrent else args.max_concurrent
+    if args.shell_fast:
+        total_unstaged, total_push, total_okay, unstaged_list, push_list = scan_all_git_repos_shell(
+            pathlib.Path(args.dir), args.branch, max_concurrent, args.include_untracked
+        )
+    else:
+        total_unstaged, total_push, total_okay, unstaged_list, push_list = scan_all_git_repos(
+            pathlib.Path(args.dir),
+            args.branch,
+            max_concurrent,
+            pathlib.Path(args.cache_file) if args.cache else None,
+            args.include_untracked,
+        )
     grand_total = total_unstaged + total_push + total_okay
-    logging.warning("\033[1;32mChecks completed")
+    verbose = logging.getLogger().isEnabledFor(logging.INFO)
+    summary = [f"{GREEN}Checks completed"]
     if total_unstaged != 0:
-        logging.warning(f"\033[1;31mUnstaged changes: {total_unstaged}")
-        logging.info(f"\033[1;31m{', '.join([str(x) for x in unstaged_list])}")
+        summary.append(f"{RED}Unstaged changes: {total_unstaged}")
+        if verbose:
+            summary.append(f"{RED}{', '.join(unstaged_list)}")
     if total_push != 0:
-        logging.warning(f"\033[1;33mRequires push: {total_push}")
-        logging.info(f"\033[1;33m{', '.join([str(x) for x in push_list])}")
+        summary.append(f"{YELLOW}Requires push: {total_push}")
+        if verbose:
+            summary.append(f"{YELLOW}{', '.join(push_list)}")
     if grand_total == total_okay:
-        logging.warning(f"\033[1;32mAll {total_okay} repositories okay.")
+        summary.append(f"{GREEN}All {total_okay} repositories okay.")
     else:
-        logging.warning(f"\033[1;33m{total_okay}/{grand_total} okay")
+        summary.append(f"{YELLOW}{total_okay}/{grand_total} okay")
+    logging.warning("\n".join(summary))
 
 
 if __name__ == "__main__":